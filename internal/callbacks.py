@@ -29,29 +29,25 @@ class KeepRunningIfWebViewerEnabled(Callback):
         if pl_module.web_viewer is None:
             return
         print("Training finished! Web viewer is still running. Press `Ctrl+C` to exist.")
+        web_viewer = pl_module.web_viewer
+        # pausing and resuming have no meaning once training has finished
+        web_viewer.pause_training_button.visible = False
+        web_viewer.resume_training_button.visible = False
+        background_color = pl_module._fixed_background_color()
         while True:
-            pl_module.web_viewer.is_training_paused = True
-            pl_module.web_viewer.process_all_render_requests(pl_module.gaussian_model, pl_module.renderer, pl_module._fixed_background_color())
+            # block on the request queue until a client asks for a new frame
+            web_viewer.is_training_paused = True
+            web_viewer.process_all_render_requests(pl_module.gaussian_model, pl_module.renderer, background_color)
 
 
 class StopImageSavingThreads(Callback):
     def on_exception(self, trainer, pl_module, exception: BaseException) -> None:
-        alive_threads = pl_module.image_saving_threads
-
-        while len(alive_threads) > 0:
-            # send messages to terminate threads
-            while True:
-                try:
-                    pl_module.image_queue.put(None, block=False)
-                except:
-                    break
-
-            # check whether any threads are alive
-            still_alive_threads = []
-            for thread in alive_threads:
-                if thread.is_alive() is True:
-                    still_alive_threads.append(thread)
-            alive_threads = still_alive_threads
+        # send one message to each thread to terminate it, then wait for them to exit
+        for _ in range(len(pl_module.image_saving_threads)):
+            pl_module.image_queue.put(None)
+        for thread in pl_module.image_saving_threads:
+            thread.join()
+        pl_module.image_saving_threads = []
 
 
 class ProgressBar(TQDMProgressBar):
@@ -133,28 +133,24 @@ class MultipleGaussianModelEditor:
             self.backup_properties()
 
         model = self.gaussian_model
-        # pick properties corresponds to the specified `idx` of model
-        xyz = self._original_properties["means"][begin:end].clone().to(device)
-        # TODO: avoid memory copy if no rotation or scaling happened compared to previous state
-        scaling = self._original_properties["scales"][begin:end].clone().to(device)
-        rotation = self._original_properties["rotations"][begin:end].clone().to(device)
-        features = self._original_properties["shs"][begin:end].clone().to(device)  # consume a lot of memory
-
-        # rescale
-        xyz, scaling = gaussian_utils.GaussianTransformUtils.rescale(
-            xyz,
-            scaling,
-            scale
-        )
-        # rotate
-        xyz, rotation, new_features = gaussian_utils.GaussianTransformUtils.rotate_by_wxyz_quaternions(
+        # pick properties corresponds to the specified `idx` of model;
+        # no clone is required, the transforms below never modify their inputs in place,
+        # and the results are copied into the model's slice at the end
+        xyz = self._original_properties["means"][begin:end].to(device)
+        scaling = self._original_properties["scales"][begin:end].to(device)
+        rotation = self._original_properties["rotations"][begin:end].to(device)
+        features = self._original_properties["shs"][begin:end].to(device)
+
+        # rescale, rotate and translate
+        xyz, scaling, rotation, new_features = gaussian_utils.GaussianTransformUtils.transform_by_vectors(
             xyz=xyz,
+            scales=scaling,
             rotations=rotation,
             features=features,
+            scale=scale,
             quaternions=torch.tensor(r_wxyz).to(xyz),
+            t_xyz=torch.tensor(t_xyz).to(xyz),
         )
-        # translate
-        xyz = gaussian_utils.GaussianTransformUtils.translation(xyz, *t_xyz.tolist())
 
         # `model.NAME = value` not works if value is a nn.Parameter
         new_properties = {
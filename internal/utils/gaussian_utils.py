@@ -1,7 +1,7 @@
 import os
 import numpy as np
 import torch
-from internal.utils.colmap import rotmat2qvec, qvec2rotmat
+from internal.utils.rotation import qvec2rot
 from typing import Union
 from dataclasses import dataclass
 from plyfile import PlyData, PlyElement
@@ -299,17 +299,14 @@ class GaussianTransformUtils:
 
         try:
             from e3nn import o3
-            import einops
-            from einops import einsum
         except:
-            print("Please run `pip install e3nn einops` to enable SHs rotation")
+            print("Please run `pip install e3nn` to enable SHs rotation")
             return features
 
-        if features.shape[1] == 1:
+        n_shs_rest = features.shape[1] - 1
+        if n_shs_rest == 0:
             return features
 
-        features = features.clone()
-
         shs_feat = features[:, 1:, :]
 
         ## rotate shs
@@ -322,69 +319,117 @@ class GaussianTransformUtils:
         permuted_rotation_matrix = inversed_P @ rotation_matrix @ P
         rot_angles = o3._rotation.matrix_to_angles(permuted_rotation_matrix.cpu())
 
-        # Construction coefficient
-        D_1 = o3.wigner_D(1, rot_angles[0], - rot_angles[1], rot_angles[2]).to(device=shs_feat.device)
-        D_2 = o3.wigner_D(2, rot_angles[0], - rot_angles[1], rot_angles[2]).to(device=shs_feat.device)
-        D_3 = o3.wigner_D(3, rot_angles[0], - rot_angles[1], rot_angles[2]).to(device=shs_feat.device)
-
-        # rotation of the shs features
-        one_degree_shs = shs_feat[:, 0:3]
-        one_degree_shs = einops.rearrange(one_degree_shs, 'n shs_num rgb -> n rgb shs_num')
-        one_degree_shs = einsum(
-            D_1,
-            one_degree_shs,
-            "... i j, ... j -> ... i",
-        )
-        one_degree_shs = einops.rearrange(one_degree_shs, 'n rgb shs_num -> n shs_num rgb')
-        shs_feat[:, 0:3] = one_degree_shs
-
-        if shs_feat.shape[1] >= 4:
-            two_degree_shs = shs_feat[:, 3:8]
-            two_degree_shs = einops.rearrange(two_degree_shs, 'n shs_num rgb -> n rgb shs_num')
-            two_degree_shs = einsum(
-                D_2,
-                two_degree_shs,
-                "... i j, ... j -> ... i",
-            )
-            two_degree_shs = einops.rearrange(two_degree_shs, 'n rgb shs_num -> n shs_num rgb')
-            shs_feat[:, 3:8] = two_degree_shs
-
-            if shs_feat.shape[1] >= 9:
-                three_degree_shs = shs_feat[:, 8:15]
-                three_degree_shs = einops.rearrange(three_degree_shs, 'n shs_num rgb -> n rgb shs_num')
-                three_degree_shs = einsum(
-                    D_3,
-                    three_degree_shs,
-                    "... i j, ... j -> ... i",
-                )
-                three_degree_shs = einops.rearrange(three_degree_shs, 'n rgb shs_num -> n shs_num rgb')
-                shs_feat[:, 8:15] = three_degree_shs
-
-        return features
+        # Construction coefficient, one Wigner-D block per degree
+        D = torch.block_diag(*[
+            o3.wigner_D(degree, rot_angles[0], - rot_angles[1], rot_angles[2])
+            for degree in range(1, SHS_REST_DIM_TO_DEGREE[n_shs_rest] + 1)
+        ]).to(shs_feat)
+
+        # rotate all degrees at once: [n_shs_rest, n_shs_rest] @ [n, n_shs_rest, rgb]
+        return torch.concat([features[:, :1, :], torch.matmul(D, shs_feat)], dim=1)
 
     @classmethod
     def rotate_by_wxyz_quaternions(cls, xyz, rotations, features, quaternions: torch.tensor):
-        if torch.all(quaternions == 0.) or torch.all(quaternions == torch.tensor(
-                [1., 0., 0., 0.],
-                dtype=quaternions.dtype,
-                device=quaternions.device,
-        )):
+        if cls.is_identity_wxyz(quaternions):
             return xyz, rotations, features
 
-        # convert quaternions to rotation matrix
-        rotation_matrix = torch.tensor(qvec2rotmat(quaternions.cpu().numpy()), dtype=torch.float, device=xyz.device)
+        # convert quaternions to rotation matrix on the device of the gaussians
+        rotation_matrix = qvec2rot(quaternions.to(device=xyz.device).unsqueeze(0))[0]
         # rotate xyz
         xyz = torch.matmul(xyz, rotation_matrix.T)
         # rotate gaussian quaternions
-        rotations = torch.nn.functional.normalize(cls.quat_multiply(
-            rotations,
-            quaternions,
-        ))
+        rotations = cls.compose_rotations(rotations, quaternions)
 
         features = cls.transform_shs(features, rotation_matrix)
 
         return xyz, rotations, features
 
+    @classmethod
+    def transform_by_vectors(cls, xyz, scales, rotations, features, scale: float, quaternions: torch.tensor, t_xyz: torch.tensor):
+        """
+        Rescale, rotate and then translate, `scales` must be activated.
+        xyz is transformed by the fused affine `xyz @ (scale * R).T + t`, so it only takes a single pass.
+        """
+
+        if scale != 1.:
+            scales = scales * scale
+
+        if cls.is_identity_wxyz(quaternions):
+            if scale == 1. and torch.all(t_xyz == 0.):
+                return xyz, scales, rotations, features
+            rotation_matrix = torch.eye(3, dtype=xyz.dtype, device=xyz.device)
+        else:
+            rotation_matrix = qvec2rot(quaternions.to(device=xyz.device).unsqueeze(0))[0].to(xyz)
+            rotations = cls.compose_rotations(rotations, quaternions)
+            features = cls.transform_shs(features, rotation_matrix)
+
+        xyz = torch.addmm(t_xyz.to(xyz).unsqueeze(0), xyz, (rotation_matrix * scale).T)
+
+        return xyz, scales, rotations, features
+
+    @staticmethod
+    def is_identity_wxyz(quaternions) -> bool:
+        return bool(torch.all(quaternions == 0.) or torch.all(quaternions == torch.tensor(
+            [1., 0., 0., 0.],
+            dtype=quaternions.dtype,
+            device=quaternions.device,
+        )))
+
+    @staticmethod
+    def rotation_matrix_to_wxyz(rotation_matrix):
+        """
+        Shoemake's closed-form conversion, [..., 3, 3] -> wxyz [..., 4], without the eigen decomposition of `rotmat2qvec`
+        """
+
+        m00, m01, m02 = rotation_matrix[..., 0, 0], rotation_matrix[..., 0, 1], rotation_matrix[..., 0, 2]
+        m10, m11, m12 = rotation_matrix[..., 1, 0], rotation_matrix[..., 1, 1], rotation_matrix[..., 1, 2]
+        m20, m21, m22 = rotation_matrix[..., 2, 0], rotation_matrix[..., 2, 1], rotation_matrix[..., 2, 2]
+        trace = m00 + m11 + m22
+
+        # the k-th row is the quaternion scaled by 4 times its k-th component
+        candidates = torch.stack([
+            torch.stack([1. + trace, m21 - m12, m02 - m20, m10 - m01], dim=-1),
+            torch.stack([m21 - m12, 1. + m00 - m11 - m22, m01 + m10, m02 + m20], dim=-1),
+            torch.stack([m02 - m20, m01 + m10, 1. - m00 + m11 - m22, m12 + m21], dim=-1),
+            torch.stack([m10 - m01, m02 + m20, m12 + m21, 1. - m00 - m11 + m22], dim=-1),
+        ], dim=-2)
+        # pick the row of the largest component, which is the numerically stable one
+        branch = torch.argmax(torch.stack([trace, m00, m11, m22], dim=-1), dim=-1)
+        quaternions = torch.gather(
+            candidates,
+            -2,
+            branch[..., None, None].expand(*branch.shape, 1, 4),
+        ).squeeze(-2)
+        quaternions = torch.nn.functional.normalize(quaternions, dim=-1)
+
+        # make `w` non-negative, the same as `rotmat2qvec`
+        return torch.where(quaternions[..., :1] < 0, -quaternions, quaternions)
+
+    @staticmethod
+    def quat_left_multiply_matrix(quaternion):
+        """
+        Build the 4x4 matrix `L` of a wxyz quaternion `q`, so that `q * p == L @ p`
+        """
+
+        w, x, y, z = quaternion.unbind(-1)
+        return torch.stack([
+            torch.stack([w, -x, -y, -z]),
+            torch.stack([x, w, -z, y]),
+            torch.stack([y, z, w, -x]),
+            torch.stack([z, -y, x, w]),
+        ])
+
+    @classmethod
+    def compose_rotations(cls, rotations, quaternion):
+        """
+        Left multiply all the gaussian rotations [n, 4] by a single wxyz quaternion [4].
+        The Hamilton product with a fixed quaternion is linear, so it is a single [n, 4] x [4, 4] matmul.
+        """
+
+        rotations = torch.matmul(rotations, cls.quat_left_multiply_matrix(quaternion).T)
+        # normalize in place instead of allocating another [n, 4] tensor
+        return rotations.div_(torch.linalg.vector_norm(rotations, dim=-1, keepdim=True).clamp_min_(1e-12))
+
     @staticmethod
     def quat_multiply(quaternion0, quaternion1):
         w0, x0, y0, z0 = torch.split(quaternion0, 1, dim=-1)
@@ -402,9 +447,9 @@ class GaussianTransformUtils:
         xyz = torch.matmul(xyz, rotation_matrix.T)
 
         # rotate via quaternion
-        rotations = torch.nn.functional.normalize(cls.quat_multiply(
+        rotations = cls.compose_rotations(
             rotations,
-            torch.tensor([rotmat2qvec(rotation_matrix.cpu().numpy())]).to(xyz),
-        ))
+            cls.rotation_matrix_to_wxyz(rotation_matrix).to(xyz),
+        )
 
         return xyz, rotations
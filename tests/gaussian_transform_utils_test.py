@@ -0,0 +1,69 @@
+import unittest
+import torch
+from internal.utils.colmap import qvec2rotmat, rotmat2qvec
+from internal.utils.gaussian_utils import GaussianTransformUtils
+from internal.utils.rotation import qvec2rot
+from internal.utils.sh_utils import eval_sh
+
+
+class GaussianTransformUtilsTestCase(unittest.TestCase):
+    def test_compose_rotations(self):
+        rotations = torch.nn.functional.normalize(torch.randn((1024, 4), dtype=torch.double))
+        quaternion = torch.nn.functional.normalize(torch.randn((4,), dtype=torch.double), dim=-1)
+
+        self.assertTrue(torch.allclose(
+            GaussianTransformUtils.compose_rotations(rotations, quaternion),
+            torch.nn.functional.normalize(GaussianTransformUtils.quat_multiply(rotations, quaternion)),
+        ))
+
+    def test_rotation_matrix_to_wxyz(self):
+        quaternions = torch.nn.functional.normalize(torch.randn((1024, 4), dtype=torch.double))
+        # cover each branch
+        quaternions[:4] = torch.eye(4, dtype=torch.double)
+        rotation_matrices = torch.stack([torch.tensor(qvec2rotmat(i.numpy())) for i in quaternions])
+
+        expected = torch.stack([torch.tensor(rotmat2qvec(i.numpy())) for i in rotation_matrices])
+        self.assertTrue(torch.allclose(GaussianTransformUtils.rotation_matrix_to_wxyz(rotation_matrices), expected))
+
+    def test_transform_shs(self):
+        features = torch.randn((1024, 16, 3), dtype=torch.double)
+        dirs = torch.nn.functional.normalize(torch.randn((1024, 3), dtype=torch.double))
+        rotation_matrix = qvec2rot(torch.nn.functional.normalize(torch.randn((1, 4)))).to(torch.double)[0]
+
+        rotated_features = GaussianTransformUtils.transform_shs(features, rotation_matrix)
+
+        # the rotated SHs viewed from the rotated directions should produce the same colors
+        self.assertTrue(torch.allclose(
+            eval_sh(3, rotated_features.transpose(1, 2), dirs @ rotation_matrix.T),
+            eval_sh(3, features.transpose(1, 2), dirs),
+            atol=1e-5,
+        ))
+
+    def test_transform_by_vectors(self):
+        xyz = torch.randn((1024, 3))
+        scales = torch.rand((1024, 3))
+        rotations = torch.nn.functional.normalize(torch.randn((1024, 4)))
+        features = torch.randn((1024, 1, 3))
+        quaternion = torch.nn.functional.normalize(torch.randn((4,)), dim=-1)
+
+        expected_xyz, expected_scales = GaussianTransformUtils.rescale(xyz, scales, 2.5)
+        expected_xyz, expected_rotations, _ = GaussianTransformUtils.rotate_by_wxyz_quaternions(expected_xyz, rotations, features, quaternion)
+        expected_xyz = GaussianTransformUtils.translation(expected_xyz, 1., -2., 3.)
+
+        fused_xyz, fused_scales, fused_rotations, _ = GaussianTransformUtils.transform_by_vectors(
+            xyz,
+            scales,
+            rotations,
+            features,
+            scale=2.5,
+            quaternions=quaternion,
+            t_xyz=torch.tensor([1., -2., 3.]),
+        )
+
+        self.assertTrue(torch.allclose(fused_xyz, expected_xyz, atol=1e-5))
+        self.assertTrue(torch.allclose(fused_scales, expected_scales))
+        self.assertTrue(torch.allclose(fused_rotations, expected_rotations))
+
+
+if __name__ == '__main__':
+    unittest.main()
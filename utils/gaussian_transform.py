@@ -11,24 +11,22 @@ from internal.utils.gaussian_utils import GaussianPlyUtils
 from viser import transforms as vt
 
 
-class RotationUtils:
-    @staticmethod
-    def rx(theta):
-        return np.matrix([[1, 0, 0],
-                          [0, np.cos(theta), -np.sin(theta)],
-                          [0, np.sin(theta), np.cos(theta)]])
-
-    @staticmethod
-    def ry(theta):
-        return np.matrix([[np.cos(theta), 0, np.sin(theta)],
-                          [0, 1, 0],
-                          [-np.sin(theta), 0, np.cos(theta)]])
-
-    @staticmethod
-    def rz(theta):
-        return np.matrix([[np.cos(theta), -np.sin(theta), 0],
-                          [np.sin(theta), np.cos(theta), 0],
-                          [0, 0, 1]])
+def rx(theta):
+    return np.asarray([[1, 0, 0],
+                       [0, np.cos(theta), -np.sin(theta)],
+                       [0, np.sin(theta), np.cos(theta)]])
+
+
+def ry(theta):
+    return np.asarray([[np.cos(theta), 0, np.sin(theta)],
+                       [0, 1, 0],
+                       [-np.sin(theta), 0, np.cos(theta)]])
+
+
+def rz(theta):
+    return np.asarray([[np.cos(theta), -np.sin(theta), 0],
+                       [np.sin(theta), np.cos(theta), 0],
+                       [0, 0, 1]])
 
 
 def parse_args():
@@ -95,7 +93,7 @@ def main():
 
         rot_mat = rotation
     else:
-        rot_mat = RotationUtils.rx(args.rx) @ RotationUtils.ry(args.ry) @ RotationUtils.rz(args.rz)
+        rot_mat = rx(args.rx) @ ry(args.ry) @ rz(args.rz)
 
     # transform
     print("transforming...")
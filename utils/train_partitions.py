@@ -4,11 +4,13 @@ import add_pypath
 from typing import Union, Optional, Literal, List, Tuple, Dict, Any
 import os
 import time
+import functools
 import traceback
 import yaml
 import torch
 import subprocess
-import selectors
+import threading
+import queue
 from dataclasses import dataclass, field
 from tqdm.auto import tqdm
 from concurrent.futures import ThreadPoolExecutor
@@ -19,6 +21,28 @@ from argparser_utils import split_stoppable_args, parser_stoppable_args
 from distibuted_tasks import configure_arg_parser_v2
 
 
+@functools.lru_cache(maxsize=None)
+def _auto_hyper_parameter(
+        n: int,
+        extra_epoch: int,
+        scalable_params: Tuple[Tuple[str, int], ...],
+        extra_epoch_scalable_params: Tuple[str, ...],
+        scale_mode: str,
+):
+    """
+    Partitions with the same image number share the same scaled hyper parameters, so cache them.
+    The returned dict is shared, do not modify it.
+    """
+
+    return auto_hyper_parameter(
+        n,
+        extra_epoch=extra_epoch,
+        scalable_params=dict(scalable_params),
+        extra_epoch_scalable_params=list(extra_epoch_scalable_params),
+        scale_mode=scale_mode,
+    )
+
+
 @dataclass
 class PartitionTrainingConfig:
     partition_dir: str
@@ -37,6 +61,7 @@ class PartitionTrainingConfig:
     training_args: Union[Tuple, List] = None
     config_file: Optional[str] = None
     srun_args: List[str] = field(default_factory=lambda: [])
+    max_parallel: int = 64
 
     def __post_init__(self):
         if self.scalable_params is None:
@@ -68,6 +93,8 @@ class PartitionTrainingConfig:
         parser.add_argument("--dry-run", action="store_true")
         parser.add_argument("--name-suffix", type=str, default="")
         parser.add_argument("--ff-densify", action="store_true", default=False)
+        parser.add_argument("--max-parallel", type=int, default=64,
+                            help="Maximum number of partitions running at the same time in SLURM mode")
         configure_arg_parser_v2(parser)
 
     @staticmethod
@@ -127,6 +154,7 @@ class PartitionTrainingConfig:
             config_file=args.config,
             training_args=training_args,
             srun_args=srun_args,
+            max_parallel=args.max_parallel,
             **cls.get_extra_init_kwargs(args),
         )
 
@@ -145,9 +173,23 @@ class PartitionTraining:
     ):
         self.path = config.partition_dir
         self.config = config
-        self.scene = torch.load(os.path.join(self.path, name), map_location="cpu")
+        try:
+            # memory map the tensors, so the large assignment tensors are only paged in when being accessed
+            self.scene = torch.load(os.path.join(self.path, name), map_location="cpu", mmap=True)
+        except (TypeError, RuntimeError):
+            # `mmap` requires torch>=2.1 and the zipfile serialization format
+            self.scene = torch.load(os.path.join(self.path, name), map_location="cpu")
         self.scene["partition_coordinates"] = PartitionCoordinates(**self.scene["partition_coordinates"])
         self.dataset_path = os.path.dirname(self.path.rstrip("/"))
+        # convert all the partition ids to strings once, instead of on every `get_partition_id_str()` call
+        self._partition_id_strs = [
+            self.partition_coordinates.get_str_id(idx)
+            for idx in range(len(self.partition_coordinates))
+        ]
+
+        # lazily calculated by `get_location_based_assignment_numbers()` and `get_image_numbers()`
+        self._location_based_assignment_numbers = None
+        self._image_numbers = None
 
     @property
     def partition_coordinates(self) -> PartitionCoordinates:
@@ -165,24 +207,47 @@ class PartitionTraining:
     def srun_output_dir(self) -> str:
         return os.path.join(self.project_output_dir, "srun-outputs")
 
+    @staticmethod
+    def _pump_stream(stream, output_queue: queue.Queue):
+        try:
+            for line in stream:
+                output_queue.put(line.rstrip("\n"))
+        finally:
+            # notify the consumer that this stream is closed, even if reading failed
+            output_queue.put(None)
+
     def run_subprocess(self, args, output_redirect) -> int:
-        sel = selectors.DefaultSelector()
-
-        with subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as p:
-            sel.register(p.stdout, selectors.EVENT_READ)
-            sel.register(p.stderr, selectors.EVENT_READ)
-
-            while True:
-                if len(sel.get_map()) == 0:
-                    break
-
-                events = sel.select()
-                for key, mask in events:
-                    line = key.fileobj.readline()
-                    if len(line) == 0:
-                        sel.unregister(key.fileobj)
-                        continue
-                    output_redirect(line.decode("utf-8").rstrip("\n"))
+        output_queue = queue.Queue()
+
+        with subprocess.Popen(
+                args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=1,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+        ) as p:
+            # read stdout and stderr in their own threads, so a partial line on one pipe can not stall the other
+            pump_threads = [threading.Thread(
+                target=self._pump_stream,
+                args=(stream, output_queue),
+                daemon=True,
+            ) for stream in (p.stdout, p.stderr)]
+            for thread in pump_threads:
+                thread.start()
+
+            n_open_streams = len(pump_threads)
+            while n_open_streams > 0:
+                line = output_queue.get()
+                if line is None:
+                    n_open_streams -= 1
+                    continue
+                output_redirect(line)
+
+            for thread in pump_threads:
+                thread.join()
             p.wait()
             return p.returncode
 
@@ -206,16 +271,23 @@ class PartitionTraining:
         return []
 
     def get_location_based_assignment_numbers(self) -> torch.Tensor:
-        return self.scene["location_based_assignments"].sum(-1)
+        if self._location_based_assignment_numbers is None:
+            self._location_based_assignment_numbers = torch.count_nonzero(self.scene["location_based_assignments"], dim=-1)
+        return self._location_based_assignment_numbers
 
     def get_partition_id_str(self, idx: int) -> str:
-        return self.partition_coordinates.get_str_id(idx)
+        return self._partition_id_strs[idx]
 
     def get_image_numbers(self) -> torch.Tensor:
-        return torch.logical_or(
-            self.scene["location_based_assignments"],
-            self.scene["visibility_based_assignments"],
-        ).sum(-1)
+        if self._image_numbers is None:
+            location_based_assignments = self.scene["location_based_assignments"]
+            visibility_based_assignments = self.scene["visibility_based_assignments"]
+            # OR row by row, so only a single [N_cameras] temporary is allocated at a time
+            self._image_numbers = torch.tensor([torch.count_nonzero(torch.logical_or(
+                location_based_assignments[partition_idx],
+                visibility_based_assignments[partition_idx],
+            )).item() for partition_idx in range(location_based_assignments.shape[0])], dtype=torch.long)
+        return self._image_numbers
 
     def get_trainable_partition_idx_list(
             self,
@@ -231,10 +303,7 @@ class PartitionTraining:
         return "{}-trained".format(self.get_experiment_name(partition_idx))
 
     def get_partition_image_number(self, partition_idx: int) -> int:
-        return torch.logical_or(
-            self.scene["location_based_assignments"][partition_idx],
-            self.scene["visibility_based_assignments"][partition_idx],
-        ).sum(-1).item()
+        return self.get_image_numbers()[partition_idx].item()
 
     def get_experiment_name(self, partition_idx: int) -> str:
         return "{}{}".format(self.get_partition_id_str(partition_idx), self.config.name_suffix)
@@ -254,11 +323,11 @@ class PartitionTraining:
         dry_run = self.config.dry_run
 
         # scale hyper parameters
-        max_steps, scaled_params, scale_up = auto_hyper_parameter(
+        max_steps, scaled_params, scale_up = _auto_hyper_parameter(
             partition_image_number,
             extra_epoch=extra_epoches,
-            scalable_params=scalable_params,
-            extra_epoch_scalable_params=extra_epoch_scalable_params,
+            scalable_params=tuple(scalable_params.items()),
+            extra_epoch_scalable_params=tuple(extra_epoch_scalable_params),
             scale_mode=self.config.scale_param_mode,
         )
 
@@ -372,12 +441,14 @@ class PartitionTraining:
         )
         print([self.get_partition_id_str(i) for i in raw_trainable_partition_idx_list])
 
-        trainable_partition_idx_list = []
-        for partition_idx in raw_trainable_partition_idx_list:
-            partition_id_str = self.get_partition_id_str(partition_idx)
-            if self.config.partition_id_strs is not None and partition_id_str not in self.config.partition_id_strs:
-                continue
-            trainable_partition_idx_list.append(partition_idx)
+        trainable_partition_idx_list = raw_trainable_partition_idx_list
+        if self.config.partition_id_strs is not None:
+            specified_partition_id_strs = set(self.config.partition_id_strs)
+            trainable_partition_idx_list = [
+                partition_idx
+                for partition_idx in raw_trainable_partition_idx_list
+                if self.get_partition_id_str(partition_idx) in specified_partition_id_strs
+            ]
 
         if len(self.config.srun_args) == 0:
             with tqdm(trainable_partition_idx_list) as t:
@@ -389,7 +460,8 @@ class PartitionTraining:
             print("Running outputs will be saved to '{}'".format(self.srun_output_dir))
             total_trainable_partitions = len(trainable_partition_idx_list)
 
-            with ThreadPoolExecutor(max_workers=total_trainable_partitions) as tpe:
+            # each thread only waits on its `srun` subprocess, but do not spawn one per partition
+            with ThreadPoolExecutor(max_workers=max(min(total_trainable_partitions, self.config.max_parallel), 1)) as tpe:
                 futures = [tpe.submit(
                     self.train_a_partition,
                     i,